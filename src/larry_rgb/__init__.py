@@ -3,13 +3,12 @@
 from __future__ import annotations
 
 import asyncio
-from functools import cache, cached_property
-from itertools import cycle
-from typing import Awaitable, Callable, TypeVar
+import time
+from functools import cache, cached_property, partial
+from typing import Awaitable, Callable, Iterator, TypeVar
 
 from larry import Color, ColorList
 from larry.config import ConfigType
-from larry.utils import clip
 
 from larry_rgb import colorlib
 from larry_rgb import hardware as hw
@@ -22,13 +21,27 @@ class Effect:
     def __init__(self) -> None:
         self.config: Config
         self.lock = asyncio.Lock()
-        self.colors: cycle[Color] = cycle([])
+        self.reset_lock = asyncio.Lock()
+        self.latest_config: Config | None = None
+        self.colors = colorlib.PaletteCursor([])
         self.running = False
+        self.epoch = 0
 
     def is_alive(self) -> bool:
         """Return True if effect is running"""
         return self.running
 
+    def superseded(self, config: Config) -> bool:
+        """Return True if a newer reset() has been called than the one for config
+
+        The first config is never superseded so that the effect always has one.
+        """
+        return config is not self.latest_config and hasattr(self, "config")
+
+    def interrupted(self, epoch: int) -> bool:
+        """Return True if the effect has been stopped or reset since the given epoch"""
+        return not self.running or self.epoch != epoch
+
     @cached_property
     def rgb(self) -> hw.RGB:
         """Returns the RGB instance.
@@ -44,25 +57,47 @@ class Effect:
 
         return hw.RGB(address=address, port=port)
 
+    def start(self, config: Config) -> asyncio.Task:
+        """Run the effect in a new task
+
+        The effect is alive from here on, not from when the task gets around to
+        running, so that it is reset rather than started again in the meantime.
+        """
+        self.running = True
+
+        return asyncio.create_task(self.run(config))
+
     async def run(self, config: Config) -> None:  # pragma: no cover
-        """Run the effect"""
-        await self.reset(config)
-        stop_color = None
+        """Run the effect until it is stopped
 
-        async with self.lock:
-            self.running = True
+        The effect needs to be marked as running first. Use start().
+        """
+        # Whatever happens (say, the first reset() fails) the effect is no longer
+        # alive when this returns so that the next plugin() call starts it again
+        try:
+            await self.reset(config)
+            stop_color = None
+
+            while self.running:
+                # Only hold the lock while taking a snapshot of the state, not for the
+                # entire gradient, so that stop() and reset() don't have to wait
+                async with self.lock:
+                    epoch = self.epoch
+                    config = self.config
+                    colors = self.colors
 
-        while self.running:
-            async with self.lock:
                 stop_color = await set_gradient(
                     self.rgb,
-                    self.colors,
-                    self.config.steps,
-                    self.config.pause_after_fade,
-                    self.config.interval,
+                    colors,
+                    config.steps,
+                    config.pause_after_fade,
+                    config.interval,
                     stop_color,
+                    interrupted=partial(self.interrupted, epoch),
+                    space=config.gradient_space,
                 )
-        self.running = False
+        finally:
+            self.running = False
 
     async def stop(self):
         """Queue the effect to stop"""
@@ -70,48 +105,122 @@ class Effect:
             self.running = False
 
     async def reset(self, config: Config) -> None:
-        """Reset the effect's color list"""
-        colors = config.colors or colorlib.get_colors(
-            config.input, config.max_palette_size, config.quality
-        )
-        if config.pastelize:
-            colors = [color.pastelize() for color in colors]
+        """Reset the effect's color list
 
-        colors = intensify_colors(colors, config.intensity)
+        The colors are acquired from the image in a thread so that the effect keeps
+        running in the meantime. Concurrent resets are applied in the order they were
+        called. A reset that is superseded by a newer one before it is applied is
+        dropped, so bursts of resets only acquire colors for the latest.
 
-        async with self.lock:
-            self.colors = cycle(colors)
+        Raise ValueError, keeping the current palette, if there are no colors.
+        """
+        self.latest_config = config
+
+        async with self.reset_lock:
+            if self.superseded(config):
+                return
+
+            colors = config.colors or await asyncio.to_thread(
+                colorlib.get_colors,
+                config.input,
+                config.max_palette_size,
+                config.quality,
+                config.max_image_size,
+            )
+            if config.pastelize:
+                colors = [color.pastelize() for color in colors]
+
+            if not colors:
+                # An empty palette would stall set_gradient(). Keep the current one
+                raise ValueError(f"No colors to cycle through in {config.input!r}")
+
+            colors = intensify_colors(colors, config.intensity)
+
+            # Cache the palette's gradients now rather than as each one comes up
+            colorlib.warm_gradients(colors, config.steps, config.gradient_space)
+
+            if self.superseded(config):
+                return
+
+            # No need for self.lock: nothing is awaited between these assignments so no
+            # other task can see one without the other. A gradient already in progress
+            # sees the new epoch and stops after its current step. The new palette
+            # picks up from the old one's position rather than starting over
+            self.colors = colorlib.PaletteCursor(colors, self.colors.index)
             self.config = config
+            self.epoch += 1
 
 
 async def set_gradient(
     rgb: hw.RGB,
-    colors: cycle[Color],
+    colors: Iterator[Color],
     steps: int,
     pause_after_fade: float,
     interval: float,
     prev_stop_color: Color | None,
     sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    clock: Callable[[], float] = time.monotonic,
+    interrupted: Callable[[], bool] = lambda: False,
+    space: str = "rgb",
 ) -> Color:
     """Set the next gradient in the cycle
 
     If prev_stop_color is None, the start color is the next color in the colors
     cycle, otherwise it's the prev_stop_color. The stop color is the next color in
     the colors cycle.
+
+    Steps are paced against deadlines on the given clock, so time spent setting the
+    colors is taken out of the wait instead of accumulating as drift. Consecutive
+    steps of the same color are waited out with a single sleep. The first step is
+    always sent, even though it's usually the color already set, so that LEDs changed
+    behind our back (another client, a restarted server) are put right again.
+
+    space is the color space the gradient is interpolated in (see
+    colorlib.gradient_lut()).
+
+    interrupted() is checked after each step. If it returns True the gradient is
+    abandoned and the current color is returned so the next gradient can pick up
+    from there.
     """
     end_colors = colorlib.get_gradient_colors(colors, prev_stop_color)
-    end_wait = pause_after_fade / 2
+    keys = colorlib.gradient_keys(*end_colors, steps, space)
+
+    deadline = clock()
+    for key, wait in gradient_steps(keys, pause_after_fade, interval):
+        rgb.set_color(colorlib.unpack_color(key))
+        deadline += wait
 
-    previous_color = None
-    for color in Color.gradient(*end_colors, steps):
-        if color != previous_color:
-            rgb.set_color(color)
-        await sleep(end_wait if color in end_colors and pause_after_fade else interval)
-        previous_color = color
+        await sleep(max(0.0, deadline - clock()))
+
+        if interrupted():
+            return colorlib.unpack_color(key)
 
     return end_colors[1]
 
 
+def gradient_steps(
+    keys: tuple[int, ...], pause_after_fade: float, interval: float
+) -> Iterator[tuple[int, float]]:
+    """Yield each step of the gradient (keys) and how long to wait after setting it
+
+    The first and last steps are waited on for half of pause_after_fade, or interval if
+    there is no pause, and the rest for interval. Consecutive steps of the same color
+    are yielded as one, with their waits added together.
+    """
+    end_wait = pause_after_fade / 2 if pause_after_fade else interval
+    last = len(keys) - 1
+    wait = 0.0
+
+    for i, key in enumerate(keys):
+        wait += end_wait if i in (0, last) else interval
+
+        if i < last and keys[i + 1] == key:
+            continue
+
+        yield key, wait
+        wait = 0.0
+
+
 @cache
 def get_effect() -> Effect:
     """Return the "global" Effect instance"""
@@ -135,21 +244,18 @@ def intensify_colors(colors: ColorList, amount: float):
         # avoid rounding issues
         return list(colors)
 
-    factor = 1 + amount
-    return [
-        Color.from_hsv((hsv[0], clip(factor * hsv[1]), hsv[2]))
-        for color in colors
-        if (hsv := color.to_hsv())
-    ]
+    return colorlib.scale_saturation(colors, 1 + amount)
 
 
 def plugin(_colors: ColorList, larry_config: ConfigType) -> asyncio.Task:
     """RGB plugin handler"""
     effect = get_effect()
-    func = effect.reset if effect.is_alive() else effect.run
     config = Config(larry_config)
 
-    return asyncio.create_task(func(config))
+    if effect.is_alive():
+        return asyncio.create_task(effect.reset(config))
+
+    return effect.start(config)
 
 
 _T = TypeVar("_T")
@@ -2,53 +2,381 @@
 
 from __future__ import annotations
 
-import tempfile
-from itertools import cycle
+import io
+import os
+from functools import lru_cache
+from typing import Iterable, Iterator
 from xml.etree import ElementTree
 
 import cairosvg
+import numpy as np
 import PIL
-from colorthief import ColorThief
 from larry import Color, ColorList
+from PIL import Image
+
+try:
+    import numba
+
+    HAVE_NUMBA = True
+except ImportError:  # pragma: no cover
+    HAVE_NUMBA = False
+
+KMEANS_ITERATIONS = 8
+MAX_IMAGE_SIZE = 400
+SVG_SNIFF_SIZE = 512
+OPAQUE = 125  # pixels with alpha values less than this are ignored
+WHITE = 250  # pixels with red, green and blue values all greater than this are ignored
+GRADIENT_SPACES = ("rgb", "linear")
+
+# Smallest table size for which every 8-bit value survives the round trip
+LINEAR_LUT_SIZE = 4096
+
+
+class PaletteCursor:
+    """Cycle endlessly through a palette, like itertools.cycle()
+
+    Unlike cycle() the position in the palette is exposed (index) so that a new palette
+    can carry on from where the old one left off.
+    """
+
+    __slots__ = ("palette", "index")
+
+    def __init__(self, palette: Iterable[Color], index: int = 0) -> None:
+        self.palette = tuple(palette)
+        self.index = index
+
+    def __iter__(self) -> PaletteCursor:
+        return self
+
+    def __next__(self) -> Color:
+        if not self.palette:
+            raise StopIteration
+
+        index = self.index % len(self.palette)
+        self.index = index + 1
+
+        return self.palette[index]
 
 
 def get_gradient_colors(
-    colors: cycle[Color], prev_stop_color: Color | None
+    colors: Iterator[Color], prev_stop_color: Color | None
 ) -> tuple[Color, Color]:
     """Return the start_color and stop_color for the next gradient cycle"""
     return prev_stop_color if prev_stop_color else next(colors), next(colors)
 
 
-def get_colors(input_fn: str, color_count: int, quality: int) -> ColorList:
-    """Return the dominant color of the given image"""
-    color_thief = get_color_thief(input_fn)
+def srgb_to_linear(values: np.ndarray) -> np.ndarray:
+    """Convert sRGB values (0-1) to linear light (0-1)"""
+    return np.where(
+        values <= 0.04045, values / 12.92, ((values + 0.055) / 1.055) ** 2.4
+    )
+
+
+def linear_to_srgb(values: np.ndarray) -> np.ndarray:
+    """Convert linear light values (0-1) to sRGB (0-1)"""
+    return np.where(
+        values <= 0.0031308, values * 12.92, 1.055 * values ** (1 / 2.4) - 0.055
+    )
+
+
+# Lookup tables so that converting to and from linear light is just indexing
+SRGB_TO_LINEAR = srgb_to_linear(np.arange(256) / 255).astype(np.float32)
+LINEAR_TO_SRGB = (
+    (linear_to_srgb(np.linspace(0, 1, LINEAR_LUT_SIZE)) * 255).round().astype(np.uint8)
+)
+
+
+def gradient_lut(
+    start: Color, stop: Color, steps: int, space: str = "rgb"
+) -> np.ndarray:
+    """Return the gradient from start to stop as a (steps, 3) uint8 array
+
+    space is the color space in which the colors are interpolated:
+
+        rgb: straight between the (sRGB) values
+        linear: in linear light. Avoids the dark midpoints of the above
+
+    Raise ValueError if space is not one of the above.
+    """
+    start_rgb = [start.red, start.green, start.blue]
+    stop_rgb = [stop.red, stop.green, stop.blue]
+
+    if space == "rgb":
+        return np.linspace(start_rgb, stop_rgb, steps).round().astype(np.uint8)
+
+    if space == "linear":
+        linear = np.linspace(SRGB_TO_LINEAR[start_rgb], SRGB_TO_LINEAR[stop_rgb], steps)
+
+        return LINEAR_TO_SRGB[(linear * (LINEAR_LUT_SIZE - 1)).round().astype(np.intp)]
+
+    raise ValueError(f"Gradient space must be one of {GRADIENT_SPACES}: {space!r}")
+
+
+@lru_cache(maxsize=128)
+def gradient_keys(
+    start: Color, stop: Color, steps: int, space: str = "rgb"
+) -> tuple[int, ...]:
+    """Return the gradient from start to stop as packed 0xRRGGBB ints
+
+    The palette is cycled so the same gradients come around again and again. They are
+    cached so that they are only computed once. Packed ints are a fraction of the
+    size of Colors and hash and compare faster.
+    """
+    lut = gradient_lut(start, stop, steps, space).astype(np.uint32)
+
+    return tuple(((lut[:, 0] << 16) | (lut[:, 1] << 8) | lut[:, 2]).tolist())
+
+
+def warm_gradients(palette: ColorList, steps: int, space: str = "rgb") -> None:
+    """Compute (and cache) the gradients between each color and the next in palette
+
+    This includes the gradient from the last color back around to the first.
+    """
+    for start, stop in zip(palette, [*palette[1:], *palette[:1]]):
+        gradient_keys(start, stop, steps, space)
+
+
+def unpack_color(key: int) -> Color:
+    """Return the Color of the given packed 0xRRGGBB int"""
+    return Color(key >> 16, (key >> 8) & 0xFF, key & 0xFF)
+
+
+def scale_saturation(colors: ColorList, factor: float) -> ColorList:
+    """Return the colors with their (HSV) saturation multiplied by factor
+
+    Saturation is clipped to 1. Hue and value are unchanged.
+    """
+    if not colors:
+        return []
+
+    rgb = np.array([(c.red, c.green, c.blue) for c in colors], dtype=np.float32)
+
+    # No need for a round trip through HSV: value is the max channel and, for a given
+    # hue, each channel's distance from the max is proportional to the saturation. So
+    # scaling the saturation scales those distances by the same ratio
+    value = np.max(rgb, axis=1, keepdims=True)
+    distance = value - rgb
+    saturation = np.divide(
+        np.max(distance, axis=1, keepdims=True),
+        value,
+        out=np.zeros_like(value),
+        where=value > 0,
+    )
+    ratio = np.divide(
+        np.clip(saturation * factor, 0, 1),
+        saturation,
+        out=np.zeros_like(saturation),
+        where=saturation > 0,
+    )
+    rgb = (value - distance * ratio).round().astype(np.uint8)
+
+    return [Color(*row) for row in rgb.tolist()]
+
+
+def get_colors(
+    input_fn: str, color_count: int, quality: int, max_size: int = MAX_IMAGE_SIZE
+) -> ColorList:
+    """Return the dominant colors of the given image
 
-    return [Color(*rgb) for rgb in color_thief.get_palette(color_count, quality)]
+    If max_size is non-zero, the image is first scaled down to fit within max_size x
+    max_size pixels. Every quality-th pixel of the image is then sampled. Transparent
+    and (near) white pixels are ignored, as ColorThief does, so that backgrounds and
+    borders don't make it into the palette. The colors are returned in order of
+    dominance.
 
+    Raise ValueError if there are no pixels left to take colors from.
 
-def get_color_thief(filename: str) -> ColorThief:
-    """Return ColorThief instance given the filename.
+    The colors are cached for as long as the file is not modified.
+    """
+    mtime_ns = os.stat(input_fn).st_mtime_ns
+
+    return list(get_cached_colors(input_fn, mtime_ns, color_count, quality, max_size))
+
+
+@lru_cache(maxsize=32)
+def get_cached_colors(
+    input_fn: str, _mtime_ns: int, color_count: int, quality: int, max_size: int
+) -> tuple[Color, ...]:
+    """Return the dominant colors of the given image
+
+    The file's modification time is only part of the cache key. It's in nanoseconds
+    because a float timestamp can't tell apart writes less than ~100ns apart.
+    """
+    pixels = np.asarray(open_image(input_fn, max_size)).reshape(-1, 4)[::quality]
+    opaque = pixels[:, 3] >= OPAQUE
+    white = (pixels[:, :3] > WHITE).all(axis=1)
+    pixels = pixels[opaque & ~white, :3]
 
-    If the given file is a raster file the ColorThief instance returned is applied to
-    that file.
+    if len(pixels) == 0:
+        raise ValueError(f"No opaque, non-white pixels in {input_fn!r}")
 
-    If the given file is an SVG, it will be converted to a raster file and the
-    ColorThief instance returned is applied to the raster file
+    return tuple(Color(*rgb) for rgb in kmeans_palette(pixels, color_count).tolist())
+
+
+def open_image(filename: str, max_size: int = 0) -> Image.Image:
+    """Return the RGBA Image given the filename.
+
+    If the given file is a raster file the Image is loaded from that file.
+
+    If the given file is an SVG, it will be rasterized in memory and the Image is
+    loaded from the raster data
 
     Otherwise PIL.UnidentifiedImageError is raised
+
+    If max_size is non-zero, the Image is scaled down to fit within max_size x
+    max_size pixels.
     """
+    if is_svg(filename):
+        try:
+            return open_svg(filename, max_size)
+        except ElementTree.ParseError as parse_error:
+            raise PIL.UnidentifiedImageError(
+                f"cannot identify image file {filename!r}"
+            ) from parse_error
+
     try:
-        return ColorThief(filename)
+        with Image.open(filename) as image:
+            return to_rgba(image, max_size)
     except PIL.UnidentifiedImageError as unidentified_image_error:
-        # Maybe it's an SVG
-        with tempfile.NamedTemporaryFile("wb", buffering=0) as tmp:
-            try:
-                tmp.write(convert_svg_to_png(filename))
-            except ElementTree.ParseError:
-                # Not a (good) SVG either. Raise the original error
-                raise unidentified_image_error from unidentified_image_error
-
-            return ColorThief(tmp.name)
+        # Maybe it's an SVG that is_svg() didn't recognize (e.g. compressed)
+        try:
+            return open_svg(filename, max_size)
+        except ElementTree.ParseError:
+            # Not a (good) SVG either. Raise the original error
+            raise unidentified_image_error from unidentified_image_error
+
+
+def open_svg(filename: str, max_size: int = 0) -> Image.Image:
+    """Rasterize the given SVG file in memory and return the RGBA Image"""
+    png = convert_svg_to_png(filename)
+
+    with Image.open(io.BytesIO(png)) as image:
+        return to_rgba(image, max_size)
+
+
+def is_svg(filename: str) -> bool:
+    """Return True if the file looks like an SVG file
+
+    Only the start of the file is checked.
+    """
+    with open(filename, "rb") as svg_file:
+        head = svg_file.read(SVG_SNIFF_SIZE)
+
+    return b"<svg" in head
+
+
+def to_rgba(image: Image.Image, max_size: int) -> Image.Image:
+    """Convert the image to RGBA, first scaling it down to max_size if non-zero"""
+    if max_size:
+        # The image is not loaded yet, so this also lets Pillow decode (JPEGs) at a
+        # reduced size
+        image.thumbnail((max_size, max_size), Image.Resampling.BILINEAR)
+
+    return image.convert("RGBA")
+
+
+def kmeans_palette(
+    pixels: np.ndarray, k: int, iters: int = KMEANS_ITERATIONS
+) -> np.ndarray:
+    """Cluster the (N, 3) array of pixels into (at most) k colors
+
+    Return a (k, 3) uint8 array of the cluster centroids, sorted by cluster weight
+    (heaviest first).  Clusters that end up empty are dropped.
+    """
+    if len(pixels) == 0:
+        return np.empty((0, 3), dtype=np.uint8)
+
+    samples = pixels.astype(np.float32)
+    centroids = initial_centroids(samples, k)
+
+    for _ in range(iters):
+        labels = nearest_centroids(samples, centroids)
+        counts = np.bincount(labels, minlength=len(centroids))
+        populated = counts > 0
+
+        for channel in range(3):
+            sums = np.bincount(labels, samples[:, channel], minlength=len(centroids))
+            centroids[populated, channel] = sums[populated] / counts[populated]
+
+    counts = np.bincount(
+        nearest_centroids(samples, centroids), minlength=len(centroids)
+    )
+    order = np.argsort(-counts, kind="stable")
+    order = order[counts[order] > 0]
+
+    return centroids[order].round().astype(np.uint8)
+
+
+def initial_centroids(samples: np.ndarray, k: int) -> np.ndarray:
+    """Pick (at most) k starting centroids from the samples
+
+    Starting with the sample furthest from the mean, each centroid is the sample
+    furthest from the centroids already chosen (maximin).  This is deterministic and
+    spreads the centroids across the color space.  Fewer than k centroids are returned
+    if there are not enough distinct colors.
+    """
+    distances = np.square(samples - samples.mean(axis=0)).sum(axis=1)
+    chosen = [samples[distances.argmax()]]
+
+    distances = np.square(samples - chosen[0]).sum(axis=1)
+    while len(chosen) < k and distances.max() > 0:
+        chosen.append(samples[distances.argmax()])
+        distances = np.minimum(distances, np.square(samples - chosen[-1]).sum(axis=1))
+
+    return np.array(chosen, dtype=np.float32)
+
+
+def nearest_centroids(samples: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Return the index of the nearest centroid for each of the samples
+
+    Uses the numba kernel if numba is installed.
+    """
+    if HAVE_NUMBA:
+        labels = np.empty(len(samples), dtype=np.int32)
+        assign_labels(
+            np.ascontiguousarray(samples, dtype=np.float32),
+            np.ascontiguousarray(centroids, dtype=np.float32),
+            labels,
+        )
+        return labels
+
+    # |s - c|² = |s|² - 2s·c + |c|².  |s|² is the same for every centroid so it can't
+    # affect the argmin and we avoid creating an (N, k, 3) intermediate array
+    distances = np.square(centroids).sum(axis=1) - 2 * samples @ centroids.T
+
+    return distances.argmin(axis=1)
+
+
+if HAVE_NUMBA:
+
+    @numba.njit(
+        numba.void(numba.float32[:, ::1], numba.float32[:, ::1], numba.int32[::1]),
+        cache=True,
+        fastmath=True,
+        parallel=True,
+    )
+    def assign_labels(  # pragma: no cover
+        samples: np.ndarray, centroids: np.ndarray, labels: np.ndarray
+    ) -> None:
+        """Store the index of each sample's nearest centroid in labels
+
+        The explicit, C-contiguous signature means the kernel is compiled once, at
+        import, with the strides known to LLVM so the distance loop is vectorized.
+        Samples are independent of each other so they are split across threads.
+        """
+        for i in numba.prange(samples.shape[0]):  # pylint: disable=not-an-iterable
+            best = 0
+            best_distance = np.inf
+            for j in range(centroids.shape[0]):
+                distance = (
+                    (samples[i, 0] - centroids[j, 0]) ** 2
+                    + (samples[i, 1] - centroids[j, 1]) ** 2
+                    + (samples[i, 2] - centroids[j, 2]) ** 2
+                )
+                if distance < best_distance:
+                    best = j
+                    best_distance = distance
+            labels[i] = best
 
 
 def convert_svg_to_png(svg_fn: str) -> bytes:
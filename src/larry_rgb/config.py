@@ -1,48 +1,67 @@
 """LarryRGB config"""
 
 import os.path
+from functools import cached_property
 
 from larry import Color
 from larry.config import ConfigType
 
 
 class Config:
-    """plugin configuration getter with defaults"""
+    """plugin configuration getter with defaults
+
+    Values are looked up (and converted) on first access only. Effect.run() reads them
+    for every gradient.
+    """
 
     def __init__(self, config: ConfigType):
         self.config = config
 
-    @property
+    @cached_property
     def address(self) -> str:
         """Address of the OpenRGB server"""
         return self.config.get("address", fallback="localhost")
 
-    @property
+    @cached_property
     def steps(self) -> int:
         """The number of steps (colors) for the color gradients"""
         return self.config.getint("gradient_steps", fallback=20)
 
-    @property
+    @cached_property
+    def gradient_space(self) -> str:
+        """The color space the gradients are interpolated in ("rgb" or "linear")"""
+        return self.config.get("gradient_space", fallback="linear")
+
+    @cached_property
     def input(self) -> str:
         """Input image file path"""
         return os.path.expanduser(self.config["input"])
 
-    @property
+    @cached_property
     def interval(self) -> float:
-        """Interval between each color in the gradient"""
+        """Interval between each color in the gradient
+
+        An interval of 0 doesn't schedule a timer at all. It only yields to the event
+        loop between colors.
+        """
         return self.config.getfloat("interval", fallback=0.05)
 
-    @property
+    @cached_property
     def max_palette_size(self) -> int:
         """Maximum number of colors to acquire from the input image"""
         return self.config.getint("max_palette_size", fallback=10)
 
-    @property
+    @cached_property
+    def max_image_size(self) -> int:
+        """Images are scaled down to this size before acquiring colors (0 to disable)"""
+        return self.config.getint("max_image_size", fallback=400)
+
+    @cached_property
     def pause_after_fade(self) -> float:
         """Number of seconds to pause between gradients"""
         return self.config.getfloat("pause_after_fade", fallback=0.0)
 
-    @property
+    @cached_property
     def quality(self) -> int:
         """Quality of image primary color calculation (higher is better)"""
         return self.config.getint("quality", fallback=10)
@@ -55,7 +74,7 @@ class Config:
 
         return NotImplemented
 
-    @property
+    @cached_property
     def pastelize(self) -> bool:
         """Whether or not to pastelize the colors acquired from the input image
 
@@ -63,14 +82,14 @@ class Config:
         """
         return self.config.getboolean("pastelize", False)
 
-    @property
+    @cached_property
     def colors(self) -> list[Color]:
         """colors to use instead of image-generated colors"""
         color_str = self.config.get("colors", fallback="").strip()
 
         return [Color(item) for item in color_str.split()]
 
-    @property
+    @cached_property
     def intensity(self) -> float:
         """Amount of intensity to add to the colors (between -1 and 1)"""
         return self.config.getfloat("intensity", fallback=0.0)
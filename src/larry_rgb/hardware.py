@@ -1,6 +1,9 @@
 """Hardware functions for larry_rgb"""
 
-from dataclasses import dataclass
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Iterable
 
 from larry import Color
 from openrgb import OpenRGBClient
@@ -10,43 +13,67 @@ from openrgb.utils import RGBColor
 OPENRGB_PORT = 6742
 
 
-def color_all_devices(openrgb: OpenRGBClient, color: Color) -> None:
-    """Set every device's color to the given color"""
-    for device in openrgb.ee_devices:
-        color_device(device, color)
-
+def color_devices(devices: Iterable[Device], rgb_color: RGBColor) -> None:
+    """Set the color of each of the given devices
 
-def color_device(device: Device, color: Color) -> None:
-    """Set the given device's color to the given color"""
-    device.set_color(RGBColor(color.red, color.green, color.blue))
+    The devices are updated in "fast" mode. Otherwise openrgb-python requests the
+    device's state back from the server after every update, doubling the round trips.
+    """
+    for device in devices:
+        device.set_color(rgb_color, fast=True)
 
 
 def make_client(address: str, port: int = OPENRGB_PORT) -> OpenRGBClient:
     """Create and initialize OpenRGBClient"""
     openrgb = OpenRGBClient(address, port)
 
+    # Each set_mode() and resize() is a round trip to the server so skip the ones
+    # that wouldn't change anything
     for device in openrgb.ee_devices:
-        device.set_mode("Direct")
+        if not is_direct_mode(device):
+            device.set_mode("Direct")
 
         # Not resizing the zones on OpenRGB 0.8 results in not all rgbs getting set on
         # my system.  See https://github.com/jath03/openrgb-python/discussions/64
         led_count = len(device.leds)
         for zone in device.zones:
-            zone.resize(led_count)
+            if len(zone.leds) != led_count:
+                zone.resize(led_count)
 
     return openrgb
 
 
-@dataclass
+def is_direct_mode(device: Device) -> bool:
+    """Return True if the device is already in "Direct" mode"""
+    return device.modes[device.active_mode].name.lower() == "direct"
+
+
+@dataclass(slots=True)
 class RGB:
     """Config for OpenRGB"""
 
     address: str = "127.0.0.1"
     port: int = OPENRGB_PORT
+    openrgb: OpenRGBClient = field(init=False, repr=False, compare=False)
+    devices: list[Device] = field(init=False, repr=False, compare=False)
+    _rgb_color: RGBColor = field(init=False, repr=False, compare=False)
 
     def __post_init__(self) -> None:
         self.openrgb = make_client(self.address, self.port)
 
+        # ee_devices is computed on every access. Only do that once
+        self.devices = self.openrgb.ee_devices
+
+        # Scratch RGBColor reused (mutated) by set_color()
+        self._rgb_color = RGBColor(0, 0, 0)
+
     def set_color(self, color: Color) -> None:
         """Send the given color to openrgb"""
-        color_all_devices(self.openrgb, color)
+        # openrgb-python packs the RGBColor into the outgoing packet right away so it
+        # is safe to reuse the same instance
+        rgb_color = self._rgb_color
+        rgb_color.red = color.red
+        rgb_color.green = color.green
+        rgb_color.blue = color.blue
+
+        color_devices(self.devices, rgb_color)
@@ -1,36 +1,129 @@
 """Tests for the larry_rgb.colorlib module"""
 
 # pylint: disable=missing-docstring
-import importlib.metadata
+import colorsys
+import os
 import tempfile
 import unittest
 from itertools import cycle
+from pathlib import Path
+from unittest import mock
 
+import numpy as np
 import PIL
+import PIL.Image
 from larry import Color
 
 from larry_rgb import colorlib
 
+TEST_DIR = Path(__file__).resolve().parent
+IMAGE = TEST_DIR / "input.jpeg"
+SVG_IMAGE = TEST_DIR / "input.svg"  # 60% #224150, 30% #7b8b93, 10% #040404
+
 RED = Color("red")
 GREEN = Color("green")
 BLUE = Color("blue")
 
 
+class ScaleSaturationTestCase(unittest.TestCase):
+    """tests for the scale_saturation() function"""
+
+    def test_matches_hsv_round_trip(self):
+        colors = [Color(200, 100, 50), Color(10, 20, 30), Color(128, 128, 128), BLUE]
+
+        for factor in [0.0, 0.5, 1.0, 1.5, 2.0]:
+            with self.subTest(factor=factor):
+                result = colorlib.scale_saturation(colors, factor)
+
+                for color, scaled in zip(colors, result):
+                    h, s, v = colorsys.rgb_to_hsv(*(i / 255 for i in color))
+                    expected = colorsys.hsv_to_rgb(h, min(1.0, s * factor), v)
+                    for actual, value in zip(scaled, expected):
+                        self.assertAlmostEqual(actual, value * 255, delta=0.5)
+
+    def test_black(self):
+        self.assertEqual(
+            colorlib.scale_saturation([Color(0, 0, 0)], 2.0), [Color(0, 0, 0)]
+        )
+
+    def test_no_colors(self):
+        self.assertEqual(colorlib.scale_saturation([], 2.0), [])
+
+
 class GetColorsTestCase(unittest.TestCase):
     """tests for the get_colors() function"""
 
+    def setUp(self):
+        # Some of these tests count cache misses
+        colorlib.get_cached_colors.cache_clear()
+
+    def test_against_image(self):
+        image_colors = colorlib.get_colors(str(IMAGE), 3, 15)
+
+        # Allow for small differences in JPEG decoding between Pillow versions
+        expected = [Color(110, 92, 73), Color(177, 139, 87), Color(47, 50, 12)]
+        self.assertEqual(len(image_colors), len(expected))
+        for color, expected_color in zip(image_colors, expected):
+            for value, expected_value in zip(color, expected_color):
+                self.assertAlmostEqual(value, expected_value, delta=3)
+
     def test_against_svg_image(self):
-        larry_pkg = importlib.metadata.distribution("larry")
-        svg_file = larry_pkg.locate_file("larry/data/gentoo-cow-gdm-remake.svg")
-        image_colors = colorlib.get_colors(str(svg_file), 3, 15)
-
-        expected = {
-            Color(34, 65, 80),
-            Color(123, 139, 147),
-            Color(4, 4, 4),
-            Color(84, 100, 111),
-        }
-        self.assertEqual(set(image_colors), expected)
+        image_colors = colorlib.get_colors(str(SVG_IMAGE), 3, 15)
+
+        expected = [Color(34, 65, 80), Color(123, 139, 147), Color(4, 4, 4)]
+        self.assertEqual(image_colors, expected)
+
+    def test_cached_until_file_modified(self):
+        with tempfile.NamedTemporaryFile(suffix=".jpeg") as image:
+            image.write(IMAGE.read_bytes())
+            image.flush()
+
+            with mock.patch.object(
+                colorlib, "open_image", wraps=colorlib.open_image
+            ) as open_image:
+                colorlib.get_colors(image.name, 3, 15)
+                colorlib.get_colors(image.name, 3, 15)
+                open_image.assert_called_once_with(image.name, 400)
+
+                os.utime(image.name, (0, 0))
+                colorlib.get_colors(image.name, 3, 15)
+                self.assertEqual(open_image.call_count, 2)
+
+    def test_cache_sees_nanosecond_modifications(self):
+        with tempfile.NamedTemporaryFile(suffix=".jpeg") as image:
+            image.write(IMAGE.read_bytes())
+            image.flush()
+            os.utime(image.name, ns=(0, 10**18))
+
+            with mock.patch.object(
+                colorlib, "open_image", wraps=colorlib.open_image
+            ) as open_image:
+                colorlib.get_colors(image.name, 3, 15)
+
+                os.utime(image.name, ns=(0, 10**18 + 1))
+                colorlib.get_colors(image.name, 3, 15)
+                self.assertEqual(open_image.call_count, 2)
+
+    def test_ignores_white_pixels(self):
+        image = PIL.Image.new("RGB", (100, 100), "white")
+        image.paste(RED, (0, 0, 30, 100))
+        image.paste(BLUE, (30, 0, 50, 100))
+
+        with tempfile.NamedTemporaryFile(suffix=".png") as png:
+            image.save(png, format="PNG")
+            png.flush()
+
+            self.assertEqual(colorlib.get_colors(png.name, 3, 1), [RED, BLUE])
+
+    def test_no_usable_pixels(self):
+        image = PIL.Image.new("RGB", (50, 50), "white")
+
+        with tempfile.NamedTemporaryFile(suffix=".png") as png:
+            image.save(png, format="PNG")
+            png.flush()
+
+            with self.assertRaises(ValueError):
+                colorlib.get_colors(png.name, 3, 1)
 
     def test_against_bad_svg_image(self):
         with tempfile.NamedTemporaryFile(suffix=".svg") as bad_svg:
@@ -40,6 +133,199 @@ class GetColorsTestCase(unittest.TestCase):
             with self.assertRaises(PIL.UnidentifiedImageError):
                 colorlib.get_colors(bad_svg.name, 3, 15)
 
+    def test_against_broken_svg_image(self):
+        with tempfile.NamedTemporaryFile(suffix=".svg") as bad_svg:
+            bad_svg.write(b"<svg><rect></svg>")
+            bad_svg.flush()
+
+            with self.assertRaises(PIL.UnidentifiedImageError):
+                colorlib.get_colors(bad_svg.name, 3, 15)
+
+
+class OpenImageTestCase(unittest.TestCase):
+    """tests for the open_image() function"""
+
+    def test(self):
+        image = colorlib.open_image(str(IMAGE))
+
+        self.assertEqual(image.mode, "RGBA")
+        self.assertEqual(image.size, (2048, 1152))
+
+    def test_with_max_size(self):
+        image = colorlib.open_image(str(IMAGE), 400)
+
+        self.assertEqual(image.mode, "RGBA")
+        self.assertEqual(image.size, (400, 225))
+
+
+class IsSVGTestCase(unittest.TestCase):
+    """tests for the is_svg() function"""
+
+    def test_svg(self):
+        with tempfile.NamedTemporaryFile() as svg:
+            svg.write(b'<?xml version="1.0"?>\n<svg width="10" height="10"></svg>')
+            svg.flush()
+
+            self.assertTrue(colorlib.is_svg(svg.name))
+
+    def test_raster_image(self):
+        self.assertFalse(colorlib.is_svg(str(IMAGE)))
+
+
+class KMeansPaletteTestCase(unittest.TestCase):
+    """tests for the kmeans_palette() function"""
+
+    def test_sorts_by_cluster_weight(self):
+        pixels = np.array(
+            [[255, 0, 0]] * 30 + [[0, 0, 255]] * 10 + [[0, 255, 0]] * 20, dtype=np.uint8
+        )
+
+        palette = colorlib.kmeans_palette(pixels, 3)
+
+        self.assertEqual(palette.tolist(), [[255, 0, 0], [0, 255, 0], [0, 0, 255]])
+        self.assertEqual(palette.dtype, np.uint8)
+
+    def test_fewer_distinct_colors_than_k(self):
+        pixels = np.array([[4, 5, 6]] * 5 + [[200, 5, 6]] * 6, dtype=np.uint8)
+
+        palette = colorlib.kmeans_palette(pixels, 10)
+
+        self.assertEqual(palette.tolist(), [[200, 5, 6], [4, 5, 6]])
+
+    @unittest.skipUnless(colorlib.HAVE_NUMBA, "numba is not installed")
+    def test_numba_and_numpy_agree(self):
+        pixels = np.array(
+            [[250, 10, 10]] * 30 + [[10, 10, 250]] * 10 + [[10, 250, 10]] * 20,
+            dtype=np.uint8,
+        )
+        palette = colorlib.kmeans_palette(pixels, 3)
+
+        with mock.patch.object(colorlib, "HAVE_NUMBA", False):
+            self.assertEqual(
+                colorlib.kmeans_palette(pixels, 3).tolist(), palette.tolist()
+            )
+
+    def test_no_pixels(self):
+        pixels = np.empty((0, 3), dtype=np.uint8)
+
+        palette = colorlib.kmeans_palette(pixels, 3)
+
+        self.assertEqual(palette.shape, (0, 3))
+
+
+class GradientLUTTestCase(unittest.TestCase):
+    """tests for the gradient_lut() function"""
+
+    def test(self):
+        lut = colorlib.gradient_lut(Color(0, 0, 0), Color(255, 128, 10), 5)
+
+        expected = [[0, 0, 0], [64, 32, 2], [128, 64, 5], [191, 96, 8], [255, 128, 10]]
+        self.assertEqual(lut.tolist(), expected)
+        self.assertEqual(lut.dtype, np.uint8)
+
+    def test_linear(self):
+        lut = colorlib.gradient_lut(Color(0, 0, 0), Color(255, 128, 10), 3, "linear")
+
+        # The midpoint is half the light, which is brighter than half the value
+        self.assertEqual(lut.tolist(), [[0, 0, 0], [188, 92, 5], [255, 128, 10]])
+        self.assertEqual(lut.dtype, np.uint8)
+
+    def test_invalid_space(self):
+        with self.assertRaises(ValueError):
+            colorlib.gradient_lut(RED, GREEN, 5, "hsv")
+
+
+class LinearLUTTestCase(unittest.TestCase):
+    """tests for the SRGB_TO_LINEAR and LINEAR_TO_SRGB tables"""
+
+    def test_round_trip(self):
+        linear = colorlib.SRGB_TO_LINEAR * (colorlib.LINEAR_LUT_SIZE - 1)
+        srgb = colorlib.LINEAR_TO_SRGB[linear.round().astype(np.intp)]
+
+        np.testing.assert_array_equal(srgb, np.arange(256))
+
+    def test_matches_formulas(self):
+        values = np.linspace(0, 1, 11)
+
+        np.testing.assert_allclose(
+            colorlib.linear_to_srgb(colorlib.srgb_to_linear(values)), values
+        )
+
+
+class GradientKeysTestCase(unittest.TestCase):
+    """tests for the gradient_keys() function"""
+
+    def test(self):
+        keys = colorlib.gradient_keys(Color(0, 0, 0), Color(255, 128, 10), 3)
+
+        self.assertEqual(keys, (0x000000, 0x804005, 0xFF800A))
+
+    def test_matches_gradient_lut(self):
+        keys = colorlib.gradient_keys(RED, BLUE, 7)
+        lut = colorlib.gradient_lut(RED, BLUE, 7)
+
+        self.assertEqual(
+            [colorlib.unpack_color(key) for key in keys],
+            [Color(*rgb) for rgb in lut.tolist()],
+        )
+
+    def test_is_cached(self):
+        keys = colorlib.gradient_keys(RED, BLUE, 7)
+
+        self.assertIs(colorlib.gradient_keys(RED, BLUE, 7), keys)
+
+
+class WarmGradientsTestCase(unittest.TestCase):
+    """tests for the warm_gradients() function"""
+
+    # pylint can't see the cache_info() and cache_clear() that lru_cache adds
+    # pylint: disable=no-value-for-parameter
+
+    def setUp(self):
+        colorlib.gradient_keys.cache_clear()
+
+    def test(self):
+        colorlib.warm_gradients([RED, GREEN, BLUE], 5, "linear")
+
+        self.assertEqual(colorlib.gradient_keys.cache_info().currsize, 3)
+
+        colorlib.gradient_keys(BLUE, RED, 5, "linear")
+
+        self.assertEqual(colorlib.gradient_keys.cache_info().hits, 1)
+
+    def test_empty_palette(self):
+        colorlib.warm_gradients([], 5)
+
+        self.assertEqual(colorlib.gradient_keys.cache_info().currsize, 0)
+
+
+class UnpackColorTestCase(unittest.TestCase):
+    """tests for the unpack_color() function"""
+
+    def test(self):
+        self.assertEqual(colorlib.unpack_color(0x123456), Color(0x12, 0x34, 0x56))
+
+
+class PaletteCursorTestCase(unittest.TestCase):
+    """tests for the PaletteCursor class"""
+
+    def test_cycles(self):
+        cursor = colorlib.PaletteCursor([RED, GREEN, BLUE])
+
+        self.assertEqual(
+            [next(cursor) for _ in range(5)], [RED, GREEN, BLUE, RED, GREEN]
+        )
+        self.assertEqual(cursor.index, 2)
+
+    def test_index_wraps_to_palette(self):
+        cursor = colorlib.PaletteCursor([RED, GREEN], 5)
+
+        self.assertEqual(next(cursor), GREEN)
+
+    def test_empty(self):
+        with self.assertRaises(StopIteration):
+            next(colorlib.PaletteCursor([]))
+
 
 class GetGradientColors(unittest.TestCase):
     """Tests for the get_gradient_colors() method"""
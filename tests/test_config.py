@@ -1,6 +1,6 @@
 # pylint: disable=missing-docstring
 from configparser import ConfigParser
-from unittest import TestCase
+from unittest import TestCase, mock
 
 from larry_rgb import Color
 from larry_rgb.config import Config, ConfigType
@@ -8,13 +8,9 @@ from larry_rgb.config import Config, ConfigType
 
 def make_config(**kwargs: str) -> Config:
     parser = ConfigParser()
-    parser.add_section("rgb")
-    config = ConfigType(parser, "rgb")
+    parser.read_dict({"rgb": kwargs})
 
-    for name, value in kwargs.items():
-        config[name] = value
-
-    return Config(config)
+    return Config(ConfigType(parser, "rgb"))
 
 
 class ConfigTestCase(TestCase):
@@ -23,3 +19,21 @@ class ConfigTestCase(TestCase):
         config = make_config(colors=colors_str)
 
         self.assertEqual(config.colors, [Color("#ff0000"), Color("#000000")])
+
+    def test_values_are_looked_up_once(self):
+        config = make_config(gradient_steps="30")
+
+        with mock.patch.object(config.config, "getint", wraps=config.config.getint):
+            self.assertEqual(config.steps, 30)
+            self.assertEqual(config.steps, 30)
+
+            config.config.getint.assert_called_once()
+
+    def test_colors_are_parsed_once(self):
+        config = make_config(colors="#ff0000 #000000")
+
+        self.assertIs(config.colors, config.colors)
+
+    def test_gradient_space(self):
+        self.assertEqual(make_config().gradient_space, "linear")
+        self.assertEqual(make_config(gradient_space="rgb").gradient_space, "rgb")
@@ -2,59 +2,51 @@
 
 # pylint: disable=missing-docstring
 import unittest
+from types import SimpleNamespace
 from unittest import mock
 
 import larry
 from openrgb import OpenRGBClient
-from openrgb.orgb import Device
 from openrgb.utils import RGBColor
 
 from larry_rgb import hardware as hw
 
+RED = larry.Color("red")
+BLUE = larry.Color("blue")
+RGB_RED = RGBColor(red=255, green=0, blue=0)
+RGB_BLUE = RGBColor(red=0, green=0, blue=255)
+LED = SimpleNamespace()
+
+
+def create_mock_openrgb(
+    devices: int, leds=1, zones=1, zone_leds=0, mode="Static"
+) -> OpenRGBClient:
+    # Only the number of leds, the names of the modes and the zones' resize() calls are
+    # looked at so plain namespaces will do. They're much cheaper to create than Mocks.
+    # Since leds are only counted, every led can be the same LED
+    modes = [SimpleNamespace(name="Static"), SimpleNamespace(name="Direct")]
+    active_mode = [mode.name for mode in modes].index(mode)
 
-def create_mock_openrgb(devices: int, leds=1, zones=1) -> OpenRGBClient:
     mock_devices = []
     for i in range(devices):
-        if isinstance(leds, int):
-            mock_leds = [mock.Mock() for _ in range(leds)]
-        else:
-            mock_leds = [mock.Mock() for _ in range(leds[i])]
+        mock_leds = [LED] * (leds if isinstance(leds, int) else leds[i])
 
         if isinstance(zones, int):
-            mock_zones = [mock.Mock() for _ in range(zones)]
+            zone_count = zones
         else:
-            mock_zones = [mock.Mock() for _ in range(zones[i])]
-
-        mock_devices.append(mock.Mock(leds=mock_leds, zones=mock_zones))
-
-    return mock.Mock(spec=OpenRGBClient, ee_devices=mock_devices)
-
-
-class ColorDeviceTestCAse(unittest.TestCase):
-    def test_sets_color_on_the_device(self):
-        blue = larry.Color("blue")
-        mock_device = mock.Mock(spec=Device)
-
-        hw.color_device(mock_device, blue)
-
-        mock_device.set_color.assert_called_once_with(RGBColor(0, 0, 255))
-
-
-class ColorAllDevicesTestCase(unittest.TestCase):
-    def test_calls_color_device_on_all_devices(self):
-        red = larry.Color("red")
-        mock_client = mock.Mock(spec=OpenRGBClient)
-        mock_client.ee_devices = [
-            mock.Mock(spec=Device),
-            mock.Mock(spec=Device),
-            mock.Mock(spec=Device),
+            zone_count = zones[i]
+        mock_zones = [
+            SimpleNamespace(leds=[LED] * zone_leds, resize=mock.Mock())
+            for _ in range(zone_count)
         ]
 
-        hw.color_all_devices(mock_client, red)
+        mock_devices.append(
+            mock.Mock(
+                leds=mock_leds, zones=mock_zones, modes=modes, active_mode=active_mode
+            )
+        )
 
-        rgb_red = RGBColor(red=255, green=0, blue=0)
-        for device in mock_client.ee_devices:
-            device.set_color.assert_called_once_with(rgb_red)
+    return mock.Mock(spec=OpenRGBClient, ee_devices=mock_devices)
 
 
 @mock.patch.object(hw, "OpenRGBClient", autospec=True)
@@ -76,6 +68,25 @@ class MakeClientTestCase(unittest.TestCase):
         for device in client.ee_devices:
             device.set_mode.assert_called_with("Direct")
 
+    def test_skips_devices_already_in_direct_mode(self, mock_openrgb_client_cls):
+        mock_openrgb_client_cls.return_value = create_mock_openrgb(3, mode="Direct")
+
+        client = hw.make_client("polaris.invalid", 1234)
+
+        for device in client.ee_devices:
+            device.set_mode.assert_not_called()
+
+    def test_skips_zones_already_sized(self, mock_openrgb_client_cls):
+        mock_openrgb_client_cls.return_value = create_mock_openrgb(
+            2, leds=3, zones=2, zone_leds=3
+        )
+
+        client = hw.make_client("polaris.invalid")
+
+        for device in client.ee_devices:
+            for zone in device.zones:
+                zone.resize.assert_not_called()
+
     def test_resizes_zones(self, mock_openrgb_client_cls):
         mock_openrgb_client_cls.return_value = create_mock_openrgb(
             3, leds=[3, 2, 1], zones=[1, 2, 3]
@@ -91,7 +102,7 @@ class MakeClientTestCase(unittest.TestCase):
         client.ee_devices[2].zones[2].resize.assert_called_once_with(1)
 
 
-@mock.patch.object(hw, "make_client", autospec=True)
+@mock.patch.object(hw, "make_client")
 class RGBDataclassTestCase(unittest.TestCase):
     """Tests for the RGB dataclass"""
 
@@ -102,14 +113,51 @@ class RGBDataclassTestCase(unittest.TestCase):
         self.assertEqual(rgb.openrgb, mock_client)
         mock_make_client.assert_called_once_with("polaris.invalid", 6742)
 
-    def test_set_color(self, _mock_make_client):
+    def test_devices(self, mock_make_client):
+        mock_make_client.return_value = create_mock_openrgb(3)
         rgb = hw.RGB(address="polaris.invalid")
-        blue = larry.Color("blue")
 
-        rgb.openrgb.ee_devices = [mock.Mock(), mock.Mock(), mock.Mock()]
+        self.assertEqual(rgb.devices, rgb.openrgb.ee_devices)
+
+    def test_eq_compares_address_and_port(self, mock_make_client):
+        mock_make_client.side_effect = lambda *args: mock.Mock(ee_devices=[mock.Mock()])
+        rgb = hw.RGB(address="polaris.invalid")
+        rgb.set_color(RED)
+
+        self.assertEqual(rgb, hw.RGB(address="polaris.invalid"))
+        self.assertNotEqual(rgb, hw.RGB(address="polaris.invalid", port=1234))
+
+    def test_set_color(self, mock_make_client):
+        mock_make_client.return_value.ee_devices = [
+            mock.Mock(),
+            mock.Mock(),
+            mock.Mock(),
+        ]
+        rgb = hw.RGB(address="polaris.invalid")
 
-        rgb.set_color(blue)
+        rgb.set_color(BLUE)
 
-        rgb_blue = RGBColor(red=0, green=0, blue=255)
         for device in rgb.openrgb.ee_devices:
-            device.set_color.assert_called_once_with(rgb_blue)
+            device.set_color.assert_called_once_with(RGB_BLUE, fast=True)
+
+    def test_set_color_resends_same_color(self, mock_make_client):
+        device = mock.Mock()
+        mock_make_client.return_value.ee_devices = [device]
+        rgb = hw.RGB(address="polaris.invalid")
+
+        rgb.set_color(RED)
+        rgb.set_color(RED)
+
+        self.assertEqual(device.set_color.call_count, 2)
+
+    def test_set_color_reuses_rgbcolor(self, mock_make_client):
+        device = mock.Mock()
+        mock_make_client.return_value.ee_devices = [device]
+        rgb = hw.RGB(address="polaris.invalid")
+
+        rgb.set_color(RED)
+        rgb.set_color(BLUE)
+
+        first, second = [args[0] for args, _ in device.set_color.call_args_list]
+        self.assertIs(first, second)
+        self.assertEqual(second, RGB_BLUE)
@@ -1,10 +1,13 @@
 # pylint: disable=missing-docstring
+import asyncio
+import inspect
 from configparser import ConfigParser
 from itertools import cycle
 from pathlib import Path
-from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest import TestCase
 from unittest.mock import AsyncMock, Mock, call, patch
 
+import numpy as np
 from larry.color import Color
 from larry.config import ConfigType
 
@@ -15,12 +18,52 @@ from larry_rgb.config import Config
 TEST_DIR = Path(__file__).resolve().parent
 IMAGE = TEST_DIR / "input.jpeg"
 
+# Filled in by setUpModule() so that merely importing the tests doesn't decode the image
+IMAGE_COLORS: list[Color] = []
+
 RED = Color("red")
 GREEN = Color("green")
 BLUE = Color("blue")
+BLACK = Color("#000000")
+WHITE = Color("#ffffff")
+
+# set_gradient() sleeps with 5 steps, an interval of 6 and a pause_after_fade of 20
+PACED_SLEEPS = [call(10.0), call(6.0), call(6.0), call(6.0), call(10.0)]
+RED_TO_GREEN = [Color(*rgb) for rgb in colorlib.gradient_lut(RED, GREEN, 5).tolist()]
+
+
+def setUpModule():  # pylint: disable=invalid-name
+    # Effect.reset() gets the input as a str. Passing the same makes it a cache hit there
+    IMAGE_COLORS[:] = colorlib.get_colors(str(IMAGE), 3, 15)
+
+
+class AsyncTestCase(TestCase):
+    """TestCase that runs async test methods on one event loop per class
+
+    IsolatedAsyncioTestCase creates and tears down a loop for every test. None of
+    these tests leave anything running on the loop so they can share one.
+    """
 
+    runner: asyncio.Runner
 
-class PluginTestCase(IsolatedAsyncioTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.runner = asyncio.Runner()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.runner.close()
+        super().tearDownClass()
+
+    def _callTestMethod(self, method):
+        if inspect.iscoroutinefunction(method):
+            self.runner.run(method())
+        else:
+            method()
+
+
+class PluginTestCase(AsyncTestCase):
     """Tests for the plugin method"""
 
     def setUp(self):
@@ -47,14 +90,43 @@ class PluginTestCase(IsolatedAsyncioTestCase):
 
         mock_reset.assert_called_once_with(Config(config))
 
+    async def test_second_call_while_starting_resets_config(self):
+        first_config = make_config(input=IMAGE)
+        second_config = make_config(input=IMAGE, interval=500)
+
+        with patch.object(larry_rgb.Effect, "run") as mock_run:
+            with patch.object(larry_rgb.Effect, "reset") as mock_reset:
+                # Neither task gets to run before the second call
+                await asyncio.gather(
+                    larry_rgb.plugin([], first_config),
+                    larry_rgb.plugin([], second_config),
+                )
+
+        mock_run.assert_called_once_with(Config(first_config))
+        mock_reset.assert_called_once_with(Config(second_config))
+
+    async def test_starts_again_after_failed_start(self):
+        effect = larry_rgb.get_effect()
+
+        with self.assertRaises(FileNotFoundError):
+            await larry_rgb.plugin([], make_config(input="/nonexistent.jpeg"))
+
+        self.assertFalse(effect.is_alive())
+
+        config = make_config(input=IMAGE)
+        with patch.object(larry_rgb.Effect, "run") as mock_run:
+            await larry_rgb.plugin([], config)
+
+        mock_run.assert_called_once_with(Config(config))
+
     def test_get_effect_when_effect_not_exists(self):
-        with patch.object(larry_rgb, "Effect", autospec=True) as mock_effect_cls:
+        with patch.object(larry_rgb, "Effect") as mock_effect_cls:
             larry_rgb.get_effect()
 
         mock_effect_cls.assert_called_once_with()
 
     def test_get_effect_when_effect_does_exist(self):
-        with patch.object(larry_rgb, "Effect", autospec=True) as mock_effect_cls:
+        with patch.object(larry_rgb, "Effect") as mock_effect_cls:
             original_effect = larry_rgb.get_effect()
             mock_effect_cls.reset_mock()
             effect = larry_rgb.get_effect()
@@ -63,35 +135,41 @@ class PluginTestCase(IsolatedAsyncioTestCase):
         mock_effect_cls.assert_not_called()
 
 
-class EffectTestCase(IsolatedAsyncioTestCase):
+class EffectTestCase(AsyncTestCase):
     """Tests for the Effect class"""
 
     async def test_reset(self):
         config = Config(make_config(input=IMAGE, max_palette_size=3, quality=15))
         effect = larry_rgb.Effect()
-        image_colors = colorlib.get_colors(IMAGE, 3, 15)
 
-        with patch.object(larry_rgb, "cycle") as mock_cycle:
-            await effect.reset(config)
+        await effect.reset(config)
 
         self.assertIs(effect.config, config)
-        self.assertEqual(effect.colors, mock_cycle.return_value)
-        mock_cycle.assert_called_once_with(image_colors)
+        self.assertEqual(effect.colors.palette, tuple(IMAGE_COLORS))
+
+    async def test_reset_without_colors_keeps_palette(self):
+        effect = larry_rgb.Effect()
+        await effect.reset(Config(make_config(colors="red blue")))
+        config = Config(make_config(input=IMAGE))
+
+        with patch.object(larry_rgb.colorlib, "get_colors", return_value=[]):
+            with self.assertRaises(ValueError):
+                await effect.reset(config)
+
+        self.assertEqual(effect.colors.palette, (RED, BLUE))
+        self.assertIsNot(effect.config, config)
 
     async def test_reset_with_pastelize_true(self):
         config = Config(
             make_config(input=IMAGE, max_palette_size=3, quality=15, pastelize=True)
         )
         effect = larry_rgb.Effect()
-        image_colors = colorlib.get_colors(IMAGE, 3, 15)
-        pastel_colors = [color.pastelize() for color in image_colors]
+        pastel_colors = [color.pastelize() for color in IMAGE_COLORS]
 
-        with patch.object(larry_rgb, "cycle") as mock_cycle:
-            await effect.reset(config)
+        await effect.reset(config)
 
         self.assertIs(effect.config, config)
-        self.assertEqual(effect.colors, mock_cycle.return_value)
-        mock_cycle.assert_called_once_with(pastel_colors)
+        self.assertEqual(effect.colors.palette, tuple(pastel_colors))
 
     async def test_with_intensity_set(self):
         config = Config(
@@ -104,23 +182,77 @@ class EffectTestCase(IsolatedAsyncioTestCase):
             )
         )
         effect = larry_rgb.Effect()
-        image_colors = colorlib.get_colors(IMAGE, 3, 15)
-        intense_colors = larry_rgb.intensify_colors(image_colors, 0.5)
+        intense_colors = larry_rgb.intensify_colors(IMAGE_COLORS, 0.5)
 
-        with patch.object(larry_rgb, "cycle") as mock_cycle:
-            await effect.reset(config)
+        await effect.reset(config)
 
-        mock_cycle.assert_called_once_with(intense_colors)
+        self.assertEqual(effect.colors.palette, tuple(intense_colors))
 
     async def test_reset_with_colors(self):
         config = Config(make_config(input=IMAGE, colors="#ff0000 #000000"))
         effect = larry_rgb.Effect()
 
-        with patch.object(larry_rgb, "cycle") as mock_cycle:
+        await effect.reset(config)
+
+        self.assertEqual(effect.colors.palette, (RED, BLACK))
+
+    async def test_reset_gets_colors_in_a_thread(self):
+        config = Config(make_config(input=IMAGE, max_palette_size=3, quality=15))
+        effect = larry_rgb.Effect()
+
+        with patch.object(
+            larry_rgb.asyncio, "to_thread", wraps=larry_rgb.asyncio.to_thread
+        ) as to_thread:
             await effect.reset(config)
 
-        self.assertEqual(effect.colors, mock_cycle.return_value)
-        mock_cycle.assert_called_once_with([Color("#ff0000"), Color("#000000")])
+        to_thread.assert_called_once_with(colorlib.get_colors, str(IMAGE), 3, 15, 400)
+
+    async def test_concurrent_resets_apply_in_order(self):
+        image_config = Config(make_config(input=IMAGE, max_palette_size=3, quality=15))
+        colors_config = Config(make_config(colors="#ff0000 #000000"))
+        effect = larry_rgb.Effect()
+
+        await asyncio.gather(effect.reset(image_config), effect.reset(colors_config))
+
+        self.assertIs(effect.config, colors_config)
+        self.assertEqual(effect.colors.palette, (RED, BLACK))
+
+    async def test_bursts_of_resets_are_coalesced(self):
+        configs = [
+            Config(make_config(input=IMAGE, max_palette_size=3, quality=15)),
+            Config(make_config(input=IMAGE, max_palette_size=4, quality=15)),
+            Config(make_config(input=IMAGE, max_palette_size=5, quality=15)),
+            Config(make_config(colors="#ff0000 #000000")),
+        ]
+        effect = larry_rgb.Effect()
+
+        with patch.object(
+            larry_rgb.asyncio, "to_thread", wraps=larry_rgb.asyncio.to_thread
+        ) as to_thread:
+            await asyncio.gather(*(effect.reset(config) for config in configs))
+
+        # The first (there was no config yet) and the last are applied
+        to_thread.assert_called_once_with(colorlib.get_colors, str(IMAGE), 3, 15, 400)
+        self.assertIs(effect.config, configs[-1])
+        self.assertEqual(effect.epoch, 2)
+
+    async def test_reset_warms_gradients(self):
+        config = Config(make_config(colors="#ff0000 #000000", gradient_steps=30))
+        effect = larry_rgb.Effect()
+
+        with patch.object(colorlib, "warm_gradients") as warm_gradients:
+            await effect.reset(config)
+
+        warm_gradients.assert_called_once_with([RED, BLACK], 30, "linear")
+
+    async def test_reset_keeps_palette_position(self):
+        effect = larry_rgb.Effect()
+        await effect.reset(Config(make_config(colors="#ff0000 #00ff00 #0000ff")))
+        next(effect.colors)
+
+        await effect.reset(Config(make_config(colors="#000000 #ffffff")))
+
+        self.assertEqual(next(effect.colors), WHITE)
 
     async def test_rgb(self):
         config = Config(make_config(input=IMAGE, max_palette_size=3, quality=15))
@@ -132,6 +264,27 @@ class EffectTestCase(IsolatedAsyncioTestCase):
 
         self.assertIs(rgb, mock_rgb.return_value)
 
+    async def test_reset_interrupts(self):
+        config = Config(make_config(input=IMAGE, colors="#ff0000 #000000"))
+        effect = larry_rgb.Effect()
+        effect.running = True
+        epoch = effect.epoch
+
+        self.assertFalse(effect.interrupted(epoch))
+
+        await effect.reset(config)
+
+        self.assertTrue(effect.interrupted(epoch))
+        self.assertFalse(effect.interrupted(effect.epoch))
+
+    async def test_stop_interrupts(self):
+        effect = larry_rgb.Effect()
+        effect.running = True
+
+        await effect.stop()
+
+        self.assertTrue(effect.interrupted(effect.epoch))
+
     async def test_stop(self):
         effect = larry_rgb.Effect()
         effect.running = True
@@ -143,99 +296,139 @@ class EffectTestCase(IsolatedAsyncioTestCase):
 
 def make_config(**kwargs) -> ConfigType:
     parser = ConfigParser()
-    parser.add_section("rgb")
-    config = ConfigType(parser, "rgb")
+    parser.read_dict({"rgb": kwargs})
 
-    for name, value in kwargs.items():
-        config[name] = str(value)
+    return ConfigType(parser, "rgb")
 
-    return config
 
+class FakeClock:
+    """Clock that only moves when told to (or slept on)"""
 
-class SetGradient(IsolatedAsyncioTestCase):
-    """Tests for the set_gradient() method"""
+    def __init__(self) -> None:
+        self.now = 0.0
 
-    async def test_with_none(self):
-        mock_rgb = Mock(spec=hardware.RGB)()
-        mock_rgb.devices = [Mock(), Mock(), Mock()]
-        mock_sleep = AsyncMock()
-
-        colors = cycle([RED, GREEN, BLUE])
-        steps = 5
-        interval = 6.0
-        pause_after_fade = 20.0
-        color = await larry_rgb.set_gradient(
-            mock_rgb, colors, steps, pause_after_fade, interval, None, mock_sleep
-        )
+    def time(self) -> float:
+        return self.now
 
-        self.assertEqual(color, GREEN)
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
 
-        gradient = Color.gradient(RED, GREEN, 5)
-        calls = [call(color) for color in gradient]
-        self.assertEqual(mock_rgb.set_color.call_args_list, calls)
+    async def sleep(self, seconds: float) -> None:
+        self.advance(seconds)
 
-        calls = [call(10.0), call(6.0), call(6.0), call(6.0), call(10.0)]
-        self.assertEqual(mock_sleep.call_args_list, calls)
 
-        mock_sleep.reset_mock()
-        color = await larry_rgb.set_gradient(
-            mock_rgb, colors, steps, pause_after_fade, interval, color, mock_sleep
-        )
+class SetGradient(AsyncTestCase):
+    """Tests for the set_gradient() method"""
 
-        self.assertEqual(color, BLUE)
-        self.assertEqual(mock_sleep.call_args_list, calls)
+    def setUp(self):
+        self.rgb = Mock(spec=hardware.RGB)()
+        self.clock = FakeClock()
+        self.sleep = AsyncMock(side_effect=self.clock.sleep)
+        self.colors = cycle([RED, GREEN, BLUE])
+
+    async def set_gradient(self, prev_stop_color: Color | None = None, **kwargs):
+        """Call set_gradient() with 5 steps, an interval of 6 and a pause of 20"""
+        return await larry_rgb.set_gradient(
+            self.rgb,
+            self.colors,
+            5,
+            20.0,
+            6.0,
+            prev_stop_color,
+            self.sleep,
+            self.clock.time,
+            **kwargs,
+        )
 
-        mock_sleep.reset_mock()
-        color = await larry_rgb.set_gradient(
-            mock_rgb, colors, steps, pause_after_fade, interval, color, mock_sleep
+    def assert_colors_set(self, expected: np.ndarray) -> None:
+        """Assert the rows of expected are the colors that were set, in order"""
+        colors_set = np.array(
+            [
+                (color.red, color.green, color.blue)
+                for ((color,), _) in self.rgb.set_color.call_args_list
+            ],
+            dtype=np.uint8,
         )
+        np.testing.assert_array_equal(colors_set, expected)
+
+    async def test_with_none(self):
+        color = None
+
+        for start, stop in [(RED, GREEN), (GREEN, BLUE), (BLUE, RED)]:
+            with self.subTest(start=start, stop=stop):
+                self.rgb.reset_mock()
+                self.sleep.reset_mock()
+
+                color = await self.set_gradient(color)
 
-        self.assertEqual(color, RED)
-        self.assertEqual(mock_sleep.call_args_list, calls)
+                self.assertEqual(color, stop)
+                self.assert_colors_set(colorlib.gradient_lut(start, stop, 5))
+                self.assertEqual(self.sleep.call_args_list, PACED_SLEEPS)
 
     async def test_with_prev_stop_color(self):
         prev_stop_color = Color(45, 23, 212)
-        mock_rgb = Mock(spec=hardware.RGB)()
-        mock_rgb.devices = [Mock(), Mock(), Mock()]
-        mock_sleep = AsyncMock()
-
-        colors = cycle([RED, GREEN, BLUE])
-        steps = 5
-        interval = 6.0
-        pause_after_fade = 20.0
-        await larry_rgb.set_gradient(
-            mock_rgb,
-            colors,
-            steps,
-            pause_after_fade,
-            interval,
-            prev_stop_color,
-            mock_sleep,
-        )
 
-        gradient = Color.gradient(prev_stop_color, RED, 5)
-        calls = [call(color) for color in gradient]
-        self.assertEqual(mock_rgb.set_color.call_args_list, calls)
+        await self.set_gradient(prev_stop_color)
+
+        self.assert_colors_set(colorlib.gradient_lut(prev_stop_color, RED, 5))
 
-        self.assertEqual(mock_sleep.call_count, 5)
-        mock_sleep.assert_called_with(10.0)
+        self.assertEqual(self.sleep.call_count, 5)
+        self.sleep.assert_called_with(10.0)
 
     async def test_with_same_color_does_not_set_again(self):
         color = Color(45, 23, 212)
-        mock_rgb = Mock(spec=hardware.RGB)()
-        mock_rgb.devices = [Mock(), Mock(), Mock()]
-        mock_sleep = AsyncMock()
+        self.colors = cycle([color])
 
-        colors = cycle([color])
-        steps = 5
-        interval = 6.0
-        pause_after_fade = 20.0
+        await self.set_gradient()
 
-        await larry_rgb.set_gradient(
-            mock_rgb, colors, steps, pause_after_fade, interval, None, mock_sleep
-        )
+        self.rgb.set_color.assert_called_once_with(color)
+
+        # The whole gradient is one color so it's waited out in one sleep
+        self.sleep.assert_called_once_with(38.0)
+
+    async def test_coalesces_sleeps_for_repeated_steps(self):
+        # With 5 steps from 0 to 1, steps 0-2 round to 0 and 3-4 round to 1
+        self.colors = cycle([Color(0, 0, 0), Color(0, 0, 1)])
+
+        await self.set_gradient()
+
+        calls = [call(Color(0, 0, 0)), call(Color(0, 0, 1))]
+        self.assertEqual(self.rgb.set_color.call_args_list, calls)
+        self.assertEqual(self.sleep.call_args_list, [call(22.0), call(16.0)])
+        self.assertEqual(self.clock.time(), 38.0)
+
+    async def test_resends_single_color_every_gradient(self):
+        self.colors = cycle([RED])
+
+        color = await self.set_gradient()
+        await self.set_gradient(color)
+
+        self.assertEqual(self.rgb.set_color.call_args_list, [call(RED), call(RED)])
+
+    async def test_interrupted(self):
+        interrupted = Mock(side_effect=[False, True])
+
+        color = await self.set_gradient(interrupted=interrupted)
+
+        self.assertEqual(color, RED_TO_GREEN[1])
+        calls = [call(RED_TO_GREEN[0]), call(RED_TO_GREEN[1])]
+        self.assertEqual(self.rgb.set_color.call_args_list, calls)
+        self.assertEqual(self.sleep.call_count, 2)
+
+    async def test_linear_space(self):
+        await self.set_gradient(space="linear")
+
+        self.assert_colors_set(colorlib.gradient_lut(RED, GREEN, 5, "linear"))
+        self.assertEqual(self.sleep.call_args_list, PACED_SLEEPS)
+
+    async def test_subtracts_time_spent_setting_colors(self):
+        self.rgb.set_color.side_effect = lambda _color: self.clock.advance(1.0)
+
+        await self.set_gradient()
 
-        mock_rgb.set_color.assert_called_once_with(color)
+        calls = [call(9.0), call(5.0), call(5.0), call(5.0), call(9.0)]
+        self.assertEqual(self.sleep.call_args_list, calls)
+        self.assertEqual(self.clock.time(), 38.0)
 
 
 class EnsureRangeTests(TestCase):